@@ -6,7 +6,7 @@ const API_BASE = '/api';
 
 export interface ApiError {
   error: string;
-  messages?: Record<string, string[]>;
+  messages?: string;
 }
 
 export interface Folder {
@@ -1,9 +1,13 @@
 """Main Flask application for the song writing app."""
+import hashlib
 import os
-from flask import Flask, jsonify, request, send_from_directory, send_file
+from typing import Optional
+import msgspec
+from flask import Flask, Response, g, jsonify, request, send_from_directory, send_file, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager, get_jwt_identity
-from marshmallow import ValidationError
+from flask_compress import Compress
+from flask_jwt_extended import JWTManager, get_jwt_identity, verify_jwt_in_request
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -11,24 +15,59 @@ load_dotenv()
 
 # Import modules
 from db import init_db, db
-from security import configure_jwt, hash_password, verify_password, create_tokens, optional_auth
+from security import (
+    AUTH_ENABLED, configure_jwt, hash_password, verify_password, create_tokens
+)
 from schemas import (
-    FolderSchema, SongSchema, LoginSchema, RegisterSchema
+    FolderIn, FolderOut, SongIn, SongPatch, SongOut, SongVersionSummaryOut,
+    LoginIn, RegisterIn, dump
 )
 from services.folders import FoldersService
 from services.songs import SongsService
 from models import User
 
+
+class MsgspecJSONProvider(DefaultJSONProvider):
+    """JSON provider backed by msgspec, so jsonify() encodes in C with native datetime support."""
+
+    # Types msgspec doesn't know fall back to Flask's default conversions
+    encoder = msgspec.json.Encoder(enc_hook=DefaultJSONProvider.default)
+    decoder = msgspec.json.Decoder()
+
+    def dumps(self, obj, **kwargs):
+        return self.encoder.encode(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return self.decoder.decode(s)
+
+
 # Initialize Flask app
 app = Flask(__name__)
+app.json = MsgspecJSONProvider(app)
 
 # Configuration
 app.config['SECRET_KEY'] = os.getenv('JWT_SECRET', 'dev_secret_key')
 DEBUG = os.getenv('DEBUG', 'true').lower() == 'true'
-AUTH_ENABLED = os.getenv('AUTH_ENABLED', 'false').lower() == 'true'
+
+# Auth cookie settings, built once and shared by login/register
+# (max_age is set per cookie to match its token's lifetime)
+AUTH_COOKIE_KWARGS = {
+    'httponly': True,
+    'samesite': 'Lax',
+    'secure': not DEBUG
+}
+
+# Response compression - JSON API responses only, static React assets
+# are already minified/compressed by the build
+app.config['COMPRESS_MIMETYPES'] = ['application/json']
+app.config['COMPRESS_LEVEL'] = 6
+app.config['COMPRESS_MIN_SIZE'] = 1024
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_STREAMS'] = False  # Compressing would buffer streamed responses
 
 # Initialize extensions
 CORS(app, origins=['http://localhost:5173'], supports_credentials=True)
+Compress(app)
 jwt = JWTManager(app)
 
 # Configure JWT
@@ -37,19 +76,117 @@ configure_jwt(app)
 # Initialize database
 init_db(app)
 
-# Initialize schemas
-folder_schema = FolderSchema()
-folders_schema = FolderSchema(many=True)
-song_schema = SongSchema()
-songs_schema = SongSchema(many=True)
-login_schema = LoginSchema()
-register_schema = RegisterSchema()
+# Initialize JSON codecs
+folder_decoder = msgspec.json.Decoder(FolderIn)
+song_decoder = msgspec.json.Decoder(SongIn)
+song_patch_decoder = msgspec.json.Decoder(SongPatch)
+login_decoder = msgspec.json.Decoder(LoginIn)
+register_decoder = msgspec.json.Decoder(RegisterIn)
+json_encoder = msgspec.json.Encoder()
+msgpack_encoder = msgspec.msgpack.Encoder()
+
+
+def set_auth_cookies(response: Response, tokens: dict) -> None:
+    """Set the access and refresh token cookies on a response."""
+    # Expire each cookie with its token, so a stale access token isn't
+    # sent (and rejected) after the browser restarts
+    response.set_cookie(
+        'access_token', tokens['access_token'],
+        max_age=app.config['JWT_ACCESS_TOKEN_EXPIRES'], **AUTH_COOKIE_KWARGS
+    )
+    response.set_cookie(
+        'refresh_token', tokens['refresh_token'],
+        max_age=app.config['JWT_REFRESH_TOKEN_EXPIRES'], **AUTH_COOKIE_KWARGS
+    )
+
+
+def load_body(decoder):
+    """Decode and validate the raw request body in one pass, without caching it."""
+    return decoder.decode(request.get_data(cache=False))
+
+
+def json_response(payload) -> Response:
+    """Encode a payload (structs, dicts, lists) straight to a JSON response."""
+    return Response(json_encoder.encode(payload), mimetype='application/json')
+
+
+def wants_msgpack() -> bool:
+    """True if the client prefers MessagePack over JSON (Accept: application/msgpack)."""
+    best = request.accept_mimetypes.best_match(['application/json', 'application/msgpack'])
+    return best == 'application/msgpack'
+
+
+def negotiated_response(payload) -> Response:
+    """Encode a payload as MessagePack if the client asked for it, JSON otherwise."""
+    if wants_msgpack():
+        response = Response(msgpack_encoder.encode(payload), mimetype='application/msgpack')
+    else:
+        response = json_response(payload)
+    response.vary.add('Accept')
+    return response
+
+
+def make_etag(*parts) -> str:
+    """Build an ETag value from a version fingerprint (counts, timestamps, IDs)."""
+    return hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+
+def with_etag(response: Response, etag: str) -> Response:
+    """Tag a response so the client revalidates it with If-None-Match."""
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def not_modified(etag: str, vary: tuple = ()) -> Optional[Response]:
+    """
+    Return a 304 response if the client's cached copy is still current, else None.
+
+    Pass the headers the full response varies on (e.g. ('Accept',) for
+    negotiated responses) so the 304 carries the same Vary as the 200.
+    """
+    # Flask-Compress appends ':<encoding>' to the ETag of compressed responses
+    cached = {tag.split(':', 1)[0] for tag in request.if_none_match.as_set(include_weak=True)}
+    if etag in cached:
+        response = Response(status=304)
+        response.vary.update(vary)
+        return with_etag(response, etag)
+    return None
+
+
+def json_stream_response(items, schema) -> Response:
+    """Stream a JSON array item by item so the client starts receiving bytes early."""
+    def generate():
+        yield b'['
+        for i, item in enumerate(items):
+            if i:
+                yield b','
+            yield json_encoder.encode(dump(item, schema))
+        yield b']'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+# Endpoints that don't act on behalf of a user - no JWT resolution needed
+PUBLIC_ENDPOINTS = {'register', 'login', 'logout', 'health_check', 'serve_react', 'static'}
+
+
+@app.before_request
+def resolve_user():
+    """
+    Resolve the current user once per request and store it on g.user_id.
+    If AUTH_ENABLED is false, proceeds without authentication (user_id is None).
+    """
+    g.user_id = None
+    if AUTH_ENABLED and request.endpoint is not None and request.endpoint not in PUBLIC_ENDPOINTS:
+        verify_jwt_in_request(optional=True)
+        g.user_id = get_jwt_identity()
 
 
 # Error handlers
-@app.errorhandler(ValidationError)
+@app.errorhandler(msgspec.DecodeError)
 def handle_validation_error(e):
-    return jsonify({'error': 'Validation error', 'messages': e.messages}), 400
+    return jsonify({'error': 'Validation error', 'messages': str(e)}), 400
 
 
 @app.errorhandler(ValueError)
@@ -73,19 +210,19 @@ def register():
         return jsonify({'message': 'Authentication is disabled'}), 200
 
     try:
-        data = register_schema.load(request.json)
-    except ValidationError as e:
-        return jsonify({'error': 'Validation error', 'messages': e.messages}), 400
+        data = load_body(register_decoder)
+    except msgspec.DecodeError as e:
+        return jsonify({'error': 'Validation error', 'messages': str(e)}), 400
 
     # Check if user exists
-    existing_user = db.session.query(User).filter_by(email=data['email']).first()
+    existing_user = db.session.query(User).filter_by(email=data.email).first()
     if existing_user:
         return jsonify({'error': 'Email already registered'}), 409
 
     # Create new user
     user = User(
-        email=data['email'],
-        password_hash=hash_password(data['password'])
+        email=data.email,
+        password_hash=hash_password(data.password)
     )
     db.session.add(user)
     db.session.commit()
@@ -99,8 +236,7 @@ def register():
     })
 
     # Set cookies
-    response.set_cookie('access_token', tokens['access_token'], httponly=True, samesite='Lax')
-    response.set_cookie('refresh_token', tokens['refresh_token'], httponly=True, samesite='Lax')
+    set_auth_cookies(response, tokens)
 
     return response, 201
 
@@ -112,13 +248,13 @@ def login():
         return jsonify({'message': 'Authentication is disabled'}), 200
 
     try:
-        data = login_schema.load(request.json)
-    except ValidationError as e:
-        return jsonify({'error': 'Validation error', 'messages': e.messages}), 400
+        data = load_body(login_decoder)
+    except msgspec.DecodeError as e:
+        return jsonify({'error': 'Validation error', 'messages': str(e)}), 400
 
     # Find user
-    user = db.session.query(User).filter_by(email=data['email']).first()
-    if not user or not verify_password(data['password'], user.password_hash):
+    user = db.session.query(User).filter_by(email=data.email).first()
+    if not user or not verify_password(data.password, user.password_hash):
         return jsonify({'error': 'Invalid email or password'}), 401
 
     if not user.is_active:
@@ -133,8 +269,7 @@ def login():
     })
 
     # Set cookies
-    response.set_cookie('access_token', tokens['access_token'], httponly=True, samesite='Lax')
-    response.set_cookie('refresh_token', tokens['refresh_token'], httponly=True, samesite='Lax')
+    set_auth_cookies(response, tokens)
 
     return response, 200
 
@@ -150,114 +285,130 @@ def logout():
 
 # Folder endpoints
 @app.route('/api/folders', methods=['GET'])
-@optional_auth
-def get_folders(user_id=None):
+def get_folders():
     """Get all folders for the current user."""
+    user_id = g.user_id
+    etag = make_etag(user_id, *FoldersService.get_folders_version(user_id))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
     folders = FoldersService.get_folders_with_counts(user_id)
-    return jsonify(folders), 200
+    return with_etag(json_response(dump(folders, list[FolderOut])), etag), 200
 
 
 @app.route('/api/folders', methods=['POST'])
-@optional_auth
-def create_folder(user_id=None):
+def create_folder():
     """Create a new folder."""
+    user_id = g.user_id
     try:
-        data = folder_schema.load(request.json, partial=True)
-    except ValidationError as e:
-        return jsonify({'error': 'Validation error', 'messages': e.messages}), 400
+        data = load_body(folder_decoder)
+    except msgspec.DecodeError as e:
+        return jsonify({'error': 'Validation error', 'messages': str(e)}), 400
 
-    folder = FoldersService.create_folder(data['name'], user_id)
-    return jsonify(folder_schema.dump(folder)), 201
+    folder = FoldersService.create_folder(data.name, user_id)
+    return json_response(dump(folder, FolderOut)), 201
 
 
 @app.route('/api/folders/<int:folder_id>', methods=['PATCH'])
-@optional_auth
-def update_folder(folder_id, user_id=None):
+def update_folder(folder_id):
     """Update a folder's name."""
+    user_id = g.user_id
     try:
-        data = folder_schema.load(request.json, partial=True)
-    except ValidationError as e:
-        return jsonify({'error': 'Validation error', 'messages': e.messages}), 400
+        data = load_body(folder_decoder)
+    except msgspec.DecodeError as e:
+        return jsonify({'error': 'Validation error', 'messages': str(e)}), 400
 
-    folder = FoldersService.update_folder(folder_id, data['name'], user_id)
+    folder = FoldersService.update_folder(folder_id, data.name, user_id)
     if not folder:
         return jsonify({'error': 'Folder not found'}), 404
 
-    return jsonify(folder_schema.dump(folder)), 200
+    return json_response(dump(folder, FolderOut)), 200
 
 
 @app.route('/api/folders/<int:folder_id>', methods=['DELETE'])
-@optional_auth
-def delete_folder(folder_id, user_id=None):
+def delete_folder(folder_id):
     """Delete a folder and all its songs."""
+    user_id = g.user_id
     if FoldersService.delete_folder(folder_id, user_id):
         return jsonify({'message': 'Folder deleted'}), 200
     return jsonify({'error': 'Folder not found'}), 404
 
 
 @app.route('/api/folders/<int:folder_id>/songs', methods=['GET'])
-@optional_auth
-def get_folder_songs(folder_id, user_id=None):
+def get_folder_songs(folder_id):
     """Get all songs in a folder."""
+    user_id = g.user_id
+    etag = make_etag(user_id, folder_id, wants_msgpack(),
+                     *FoldersService.get_folder_songs_version(folder_id, user_id))
+    cached = not_modified(etag, vary=('Accept',))
+    if cached:
+        return cached
+
     songs = FoldersService.get_folder_songs(folder_id, user_id)
-    return jsonify(songs_schema.dump(songs)), 200
+    return with_etag(negotiated_response(dump(songs, list[SongOut])), etag), 200
 
 
 # Song endpoints
 @app.route('/api/songs', methods=['POST'])
-@optional_auth
-def create_song(user_id=None):
+def create_song():
     """Create a new song."""
+    user_id = g.user_id
     try:
-        data = song_schema.load(request.json)
-    except ValidationError as e:
-        return jsonify({'error': 'Validation error', 'messages': e.messages}), 400
+        data = load_body(song_decoder)
+    except msgspec.DecodeError as e:
+        return jsonify({'error': 'Validation error', 'messages': str(e)}), 400
 
     try:
         song = SongsService.create_song(
-            title=data['title'],
-            content_chordpro=data['content_chordpro'],
-            folder_id=data.get('folder_id'),
-            author=data.get('author'),
-            capo=data.get('capo', 0),
-            transpose_semitones=data.get('transpose_semitones', 0),
+            title=data.title,
+            content_chordpro=data.content_chordpro,
+            folder_id=data.folder_id,
+            author=data.author,
+            capo=data.capo,
+            transpose_semitones=data.transpose_semitones,
             user_id=user_id
         )
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
 
-    return jsonify(song_schema.dump(song)), 201
+    return json_response(dump(song, SongOut)), 201
 
 
 @app.route('/api/songs/<int:song_id>', methods=['GET'])
-@optional_auth
-def get_song(song_id, user_id=None):
+def get_song(song_id):
     """Get a song by ID."""
+    user_id = g.user_id
     song = SongsService.get_song(song_id, user_id)
     if not song:
         return jsonify({'error': 'Song not found'}), 404
 
-    return jsonify(song_schema.dump(song)), 200
+    etag = make_etag(song.id, song.updated_at.isoformat())
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    return with_etag(json_response(dump(song, SongOut)), etag), 200
 
 
 @app.route('/api/songs/<int:song_id>', methods=['PATCH'])
-@optional_auth
-def update_song(song_id, user_id=None):
+def update_song(song_id):
     """Update a song."""
+    user_id = g.user_id
     try:
-        data = song_schema.load(request.json, partial=True)
-    except ValidationError as e:
-        return jsonify({'error': 'Validation error', 'messages': e.messages}), 400
+        data = load_body(song_patch_decoder)
+    except msgspec.DecodeError as e:
+        return jsonify({'error': 'Validation error', 'messages': str(e)}), 400
 
     try:
         song = SongsService.update_song(
             song_id=song_id,
-            title=data.get('title'),
-            content_chordpro=data.get('content_chordpro'),
-            folder_id=data.get('folder_id'),
-            author=data.get('author'),
-            capo=data.get('capo'),
-            transpose_semitones=data.get('transpose_semitones'),
+            title=data.title,
+            content_chordpro=data.content_chordpro,
+            folder_id=data.folder_id,
+            author=data.author,
+            capo=data.capo,
+            transpose_semitones=data.transpose_semitones,
             user_id=user_id
         )
     except ValueError as e:
@@ -266,55 +417,50 @@ def update_song(song_id, user_id=None):
     if not song:
         return jsonify({'error': 'Song not found'}), 404
 
-    return jsonify(song_schema.dump(song)), 200
+    return json_response(dump(song, SongOut)), 200
 
 
 @app.route('/api/songs/<int:song_id>', methods=['DELETE'])
-@optional_auth
-def delete_song(song_id, user_id=None):
+def delete_song(song_id):
     """Delete a song."""
+    user_id = g.user_id
     if SongsService.delete_song(song_id, user_id):
         return jsonify({'message': 'Song deleted'}), 200
     return jsonify({'error': 'Song not found'}), 404
 
 
 @app.route('/api/search', methods=['GET'])
-@optional_auth
-def search_songs(user_id=None):
+def search_songs():
     """Search songs by title, author, or content."""
+    user_id = g.user_id
     query = request.args.get('q', '')
     if not query:
         return jsonify({'error': 'Search query required'}), 400
 
     songs = SongsService.search_songs(query, user_id)
-    return jsonify(songs_schema.dump(songs)), 200
+    return negotiated_response(dump(songs, list[SongOut])), 200
 
 
 @app.route('/api/songs/<int:song_id>/versions', methods=['GET'])
-@optional_auth
-def get_song_versions(song_id, user_id=None):
+def get_song_versions(song_id):
     """Get version history for a song."""
+    user_id = g.user_id
     versions = SongsService.get_song_versions(song_id, user_id)
-    return jsonify([{
-        'id': v.id,
-        'created_at': v.created_at,
-        'capo': v.capo,
-        'transpose_semitones': v.transpose_semitones
-    } for v in versions]), 200
+    return json_stream_response(versions, SongVersionSummaryOut), 200
 
 
 @app.route('/api/songs/<int:song_id>/export/pdf', methods=['POST'])
-@optional_auth
-def export_song_pdf(song_id, user_id=None):
+def export_song_pdf(song_id):
     """Export a song as PDF (placeholder - actual PDF generation in frontend)."""
+    user_id = g.user_id
     song = SongsService.get_song(song_id, user_id)
     if not song:
         return jsonify({'error': 'Song not found'}), 404
 
     # In production, this would generate a PDF server-side or return a signed URL
     # For now, we return the song data for client-side PDF generation
-    return jsonify({
-        'song': song_schema.dump(song),
+    return json_response({
+        'song': dump(song, SongOut),
         'message': 'Generate PDF on client side'
     }), 200
 
@@ -341,5 +487,7 @@ def serve_react(path):
 
 
 if __name__ == '__main__':
+    # Development server only. In production run under Gunicorn:
+    #   gunicorn -c gunicorn_conf.py wsgi:app
     port = int(os.getenv('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=DEBUG)
\ No newline at end of file
@@ -1,6 +1,10 @@
 """Database configuration and initialization."""
 import os
+import sqlite3
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect, make_url, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError, OperationalError
 from sqlalchemy.orm import DeclarativeBase
 
 class Base(DeclarativeBase):
@@ -8,18 +12,173 @@ class Base(DeclarativeBase):
 
 db = SQLAlchemy(model_class=Base)
 
+# Columns added after the first release: (table, column, backfill statement).
+# db.create_all() only creates missing tables, so these are added by upgrade_schema(),
+# with the column type taken from the model and compiled for the database in use.
+ADDED_COLUMNS = [
+    ('folders', 'updated_at', "UPDATE folders SET updated_at = created_at"),
+]
+
+# Indexes replaced by composite indexes, dropped by upgrade_schema()
+DROPPED_INDEXES = ['idx_songs_folder', 'idx_songs_user']
+
+# FTS5 index mirroring songs (external content table, kept in sync by triggers).
+# The trigram tokenizer gives case-insensitive substring matching, the same
+# semantics as the ILIKE '%q%' search it replaces.
+SEARCH_INDEX_DDL = [
+    """CREATE VIRTUAL TABLE songs_fts USING fts5(
+        title, author, content_chordpro,
+        content='songs', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS songs_fts_ai AFTER INSERT ON songs BEGIN
+        INSERT INTO songs_fts(rowid, title, author, content_chordpro)
+        VALUES (new.id, new.title, new.author, new.content_chordpro);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS songs_fts_ad AFTER DELETE ON songs BEGIN
+        INSERT INTO songs_fts(songs_fts, rowid, title, author, content_chordpro)
+        VALUES ('delete', old.id, old.title, old.author, old.content_chordpro);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS songs_fts_au AFTER UPDATE OF title, author, content_chordpro ON songs BEGIN
+        INSERT INTO songs_fts(songs_fts, rowid, title, author, content_chordpro)
+        VALUES ('delete', old.id, old.title, old.author, old.content_chordpro);
+        INSERT INTO songs_fts(rowid, title, author, content_chordpro)
+        VALUES (new.id, new.title, new.author, new.content_chordpro);
+    END""",
+    # Index any songs that existed before the index was created
+    """INSERT INTO songs_fts(songs_fts) VALUES ('rebuild')""",
+]
+
+# On PostgreSQL, search keeps using ILIKE '%q%'; a trigram GIN index lets
+# the planner answer it with a bitmap index scan instead of a full scan.
+PG_SEARCH_INDEX_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """CREATE INDEX IF NOT EXISTS idx_songs_search_trgm ON songs
+        USING gin (title gin_trgm_ops, author gin_trgm_ops, content_chordpro gin_trgm_ops)""",
+]
+
+
+@event.listens_for(Engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune every new SQLite connection for concurrent reads and fast writes."""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")        # Readers don't block the writer
+    cursor.execute("PRAGMA synchronous=NORMAL")      # Safe with WAL, fewer fsyncs
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")     # 256 MB
+    cursor.close()
+
+
+def _resolve_database_url(base_dir: str) -> str:
+    """Read DATABASE_URL, falling back to the bundled SQLite database."""
+    url = os.getenv('DATABASE_URL')
+    if not url:
+        return f"sqlite:///{os.path.join(base_dir, 'data', 'app.db')}"
+
+    # Relative SQLite paths are resolved against the server directory
+    # so the app finds the same file regardless of the working directory
+    prefix = 'sqlite:///'
+    if url.startswith(prefix):
+        path = url[len(prefix):]
+        if path and path != ':memory:' and not os.path.isabs(path):
+            return f"{prefix}{os.path.join(base_dir, path)}"
+
+    return url
+
+
+def _engine_options(database_url: str) -> dict:
+    """Engine options for the database URL; pool sizing only applies to QueuePool."""
+    options = {'pool_pre_ping': True}
+
+    # In-memory SQLite uses a single shared connection (StaticPool),
+    # which rejects pool_size/max_overflow
+    url = make_url(database_url)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return options
+
+    # Connection pool sized for concurrent Gunicorn/gevent workers
+    options['pool_size'] = 10
+    options['max_overflow'] = 20
+    return options
+
+
+def upgrade_schema():
+    """Bring columns and indexes of tables created by an older version up to date."""
+    inspector = inspect(db.engine)
+
+    with db.engine.begin() as conn:
+        for table_name, column_name, backfill in ADDED_COLUMNS:
+            existing = {column['name'] for column in inspector.get_columns(table_name)}
+            if column_name not in existing:
+                column_type = db.metadata.tables[table_name].c[column_name].type.compile(
+                    dialect=db.engine.dialect
+                )
+                conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}"))
+                conn.execute(text(backfill))
+
+        for index_name in DROPPED_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+
+        # create_all() skips indexes of tables that already exist
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+
+def init_search_index():
+    """
+    Create the songs search index if it doesn't exist yet.
+
+    Returns:
+        True if the FTS5 index is available, False if search should use LIKE
+    """
+    if db.engine.dialect.name == 'postgresql':
+        try:
+            with db.engine.begin() as conn:
+                for statement in PG_SEARCH_INDEX_DDL:
+                    conn.execute(text(statement))
+        except DBAPIError as e:
+            # pg_trgm not installed, or no privilege to create the extension
+            print(f"Warning: Trigram search index unavailable: {e}")
+        return False
+
+    if db.engine.dialect.name != 'sqlite':
+        return False
+
+    try:
+        with db.engine.begin() as conn:
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'songs_fts'")
+            ).first()
+            if not exists:
+                for statement in SEARCH_INDEX_DDL:
+                    conn.execute(text(statement))
+    except OperationalError as e:
+        # FTS5/trigram not compiled into this SQLite build
+        print(f"Warning: Full-text search index unavailable: {e}")
+        return False
+
+    return True
+
+
 def init_db(app):
     """Initialize the database with the Flask app."""
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+
     # Ensure data directory exists
-    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    data_dir = os.path.join(base_dir, 'data')
     if not os.path.exists(data_dir):
         os.makedirs(data_dir)
 
     # Configure SQLAlchemy - use absolute path for SQLite
-    db_path = os.path.join(data_dir, 'app.db')
-    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    database_url = _resolve_database_url(base_dir)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = _engine_options(database_url)
+
     # Initialize database
     db.init_app(app)
 
@@ -28,4 +187,7 @@ def init_db(app):
         # Import models here to avoid circular imports
         from models import User, Folder, Song, SongVersion
         db.create_all()
-        print(f"Database initialized successfully at: {db_path}")
\ No newline at end of file
+        upgrade_schema()
+        app.config['SEARCH_INDEX_ENABLED'] = init_search_index()
+        print(f"Database initialized successfully at: "
+              f"{make_url(database_url).render_as_string(hide_password=True)}")
@@ -0,0 +1,42 @@
+"""Gunicorn configuration for running the song writing app in production.
+
+Usage (from the server directory):
+    gunicorn -c gunicorn_conf.py wsgi:app
+"""
+import multiprocessing
+import os
+
+# Bind address
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# Request handlers are I/O-bound (SQLAlchemy queries, Argon2), so use
+# cooperative gevent workers for concurrent request handling
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gevent')
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+# Only used by the gthread worker class
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+
+# Import the app once in the master before forking, so schema upgrades,
+# search index setup and Argon2 calibration run exactly once instead of
+# concurrently in every worker (racing on CREATE TABLE on a fresh database)
+preload_app = True
+
+
+def post_fork(server, worker):
+    """Drop database connections inherited from the master; each worker opens its own."""
+    from app import app
+    from db import db
+
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+# Timeouts
+timeout = 30
+keepalive = 5
+
+# Logging
+accesslog = '-'
+errorlog = '-'
@@ -2,10 +2,40 @@
 from datetime import datetime
 from typing import Optional, List
 from sqlalchemy import String, Text, Integer, Boolean, DateTime, ForeignKey, Index
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.sql.expression import FunctionElement
 from db import db
 
 
+class utcnow(FunctionElement):
+    """
+    Current UTC timestamp, evaluated by the database inside the INSERT/UPDATE.
+
+    Used both as the column default (rendered inline by the ORM, so it also works
+    for tables created before server defaults were added) and as server_default.
+    """
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(utcnow)
+def _utcnow_default(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP"
+
+
+@compiles(utcnow, 'sqlite')
+def _utcnow_sqlite(element, compiler, **kw):
+    # CURRENT_TIMESTAMP only has second precision on SQLite; keep milliseconds
+    # so versions and ETag fingerprints still order edits made within a second
+    return "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+@compiles(utcnow, 'postgresql')
+def _utcnow_postgresql(element, compiler, **kw):
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
+
+
 class User(db.Model):
     """User model for authentication."""
     __tablename__ = 'users'
@@ -13,13 +43,14 @@ class User(db.Model):
     id: Mapped[int] = mapped_column(primary_key=True)
     email: Mapped[str] = mapped_column(String(255), unique=True, nullable=False)
     password_hash: Mapped[str] = mapped_column(Text, nullable=False)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
-    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow(), server_default=utcnow())
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow(), server_default=utcnow(), onupdate=utcnow())
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
 
     # Relationships
-    folders: Mapped[List["Folder"]] = relationship("Folder", back_populates="user", cascade="all, delete-orphan")
-    songs: Mapped[List["Song"]] = relationship("Song", back_populates="user", cascade="all, delete-orphan")
+    # Seldom needed - never lazy load these by accident (emits a whole-table scan per user)
+    folders: Mapped[List["Folder"]] = relationship("Folder", back_populates="user", cascade="all, delete-orphan", lazy="raise_on_sql")
+    songs: Mapped[List["Song"]] = relationship("Song", back_populates="user", cascade="all, delete-orphan", lazy="raise_on_sql")
 
     def __repr__(self):
         return f'<User {self.email}>'
@@ -32,7 +63,8 @@ class Folder(db.Model):
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[Optional[int]] = mapped_column(ForeignKey('users.id'), nullable=True)  # Nullable in MVP
     name: Mapped[str] = mapped_column(String(255), nullable=False)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow(), server_default=utcnow())
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow(), server_default=utcnow(), onupdate=utcnow())
 
     # Relationships
     user: Mapped[Optional["User"]] = relationship("User", back_populates="folders")
@@ -59,8 +91,8 @@ class Song(db.Model):
     capo: Mapped[int] = mapped_column(Integer, default=0)
     transpose_semitones: Mapped[int] = mapped_column(Integer, default=0)
     content_chordpro: Mapped[str] = mapped_column(Text, nullable=False)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
-    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow(), server_default=utcnow())
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow(), server_default=utcnow(), onupdate=utcnow())
 
     # Relationships
     user: Mapped[Optional["User"]] = relationship("User", back_populates="songs")
@@ -69,10 +101,12 @@ class Song(db.Model):
 
     # Indexes
     __table_args__ = (
-        Index('idx_songs_folder', 'folder_id'),
+        # Composite indexes match the listing queries: filter by folder/user,
+        # ordered by updated_at (no separate sort step)
+        Index('idx_songs_folder_updated', 'folder_id', 'updated_at'),
+        Index('idx_songs_user_updated', 'user_id', 'updated_at'),
         Index('idx_songs_title', 'title'),
         Index('idx_songs_author', 'author'),
-        Index('idx_songs_user', 'user_id'),
     )
 
     def __repr__(self):
@@ -88,10 +122,15 @@ class SongVersion(db.Model):
     content_chordpro: Mapped[str] = mapped_column(Text)
     capo: Mapped[int] = mapped_column(Integer)
     transpose_semitones: Mapped[int] = mapped_column(Integer)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow(), server_default=utcnow())
 
     # Relationships
     song: Mapped["Song"] = relationship("Song", back_populates="versions")
 
+    # Indexes
+    __table_args__ = (
+        Index('idx_song_versions_song_created', 'song_id', 'created_at'),
+    )
+
     def __repr__(self):
         return f'<SongVersion song_id={self.song_id} created_at={self.created_at}>'
\ No newline at end of file
@@ -1,69 +1,124 @@
-"""Marshmallow schemas for request/response validation."""
-from marshmallow import Schema, fields, validate, validates, ValidationError
+"""msgspec structs for request/response validation."""
+from datetime import datetime
+from typing import Annotated, Optional
 
+import msgspec
 
-class UserSchema(Schema):
+# Reusable field constraints (checked in C during decoding)
+Name = Annotated[str, msgspec.Meta(min_length=1, max_length=255)]
+Author = Annotated[str, msgspec.Meta(max_length=255)]
+Email = Annotated[str, msgspec.Meta(max_length=255, pattern=r'^[^@\s]+@[^@\s]+\.[^@\s]+$')]
+Password = Annotated[str, msgspec.Meta(min_length=8)]
+Capo = Annotated[int, msgspec.Meta(ge=0, le=12)]
+Transpose = Annotated[int, msgspec.Meta(ge=-12, le=12)]
+
+
+class UserOut(msgspec.Struct):
     """Schema for user data."""
-    id = fields.Int(dump_only=True)
-    email = fields.Email(required=True, validate=validate.Length(max=255))
-    password = fields.Str(load_only=True, required=True, validate=validate.Length(min=8))
-    created_at = fields.DateTime(dump_only=True)
-    updated_at = fields.DateTime(dump_only=True)
-    is_active = fields.Bool(dump_only=True)
+    id: int
+    email: str
+    created_at: datetime
+    updated_at: datetime
+    is_active: bool
+
 
+class FolderIn(msgspec.Struct, forbid_unknown_fields=True):
+    """Schema for folder create/update requests."""
+    name: Name
 
-class FolderSchema(Schema):
+
+class FolderOut(msgspec.Struct, omit_defaults=True):
     """Schema for folder data."""
-    id = fields.Int(dump_only=True)
-    user_id = fields.Int(dump_only=True, allow_none=True)
-    name = fields.Str(required=True, validate=validate.Length(min=1, max=255))
-    created_at = fields.DateTime(dump_only=True)
-    songs_count = fields.Int(dump_only=True)
+    id: int
+    user_id: Optional[int]
+    name: str
+    created_at: datetime
+    songs_count: Optional[int] = None
+
 
+class SongIn(msgspec.Struct, forbid_unknown_fields=True):
+    """Schema for song create requests."""
+    title: Name
+    content_chordpro: str
+    folder_id: Optional[int] = None
+    author: Optional[Author] = None
+    capo: Capo = 0
+    transpose_semitones: Transpose = 0
 
-class SongSchema(Schema):
+
+class SongPatch(msgspec.Struct, forbid_unknown_fields=True):
+    """Schema for partial song update requests (all fields optional)."""
+    title: Optional[Name] = None
+    content_chordpro: Optional[str] = None
+    folder_id: Optional[int] = None
+    author: Optional[Author] = None
+    capo: Optional[Capo] = None
+    transpose_semitones: Optional[Transpose] = None
+
+
+class SongOut(msgspec.Struct):
     """Schema for song data."""
-    id = fields.Int(dump_only=True)
-    user_id = fields.Int(dump_only=True, allow_none=True)
-    folder_id = fields.Int(allow_none=True)
-    title = fields.Str(required=True, validate=validate.Length(min=1, max=255))
-    author = fields.Str(allow_none=True, validate=validate.Length(max=255))
-    capo = fields.Int(load_default=0, validate=validate.Range(min=0, max=12))
-    transpose_semitones = fields.Int(load_default=0, validate=validate.Range(min=-12, max=12))
-    content_chordpro = fields.Str(required=True)
-    created_at = fields.DateTime(dump_only=True)
-    updated_at = fields.DateTime(dump_only=True)
-
-
-class SongVersionSchema(Schema):
+    id: int
+    user_id: Optional[int]
+    folder_id: Optional[int]
+    title: str
+    author: Optional[str]
+    capo: int
+    transpose_semitones: int
+    content_chordpro: str
+    created_at: datetime
+    updated_at: datetime
+
+
+class SongVersionOut(msgspec.Struct):
     """Schema for song version history."""
-    id = fields.Int(dump_only=True)
-    song_id = fields.Int(required=True)
-    content_chordpro = fields.Str(required=True)
-    capo = fields.Int()
-    transpose_semitones = fields.Int()
-    created_at = fields.DateTime(dump_only=True)
+    id: int
+    song_id: int
+    content_chordpro: str
+    capo: int
+    transpose_semitones: int
+    created_at: datetime
+
 
+class SongVersionSummaryOut(msgspec.Struct):
+    """Schema for song version history listings (without content)."""
+    id: int
+    created_at: datetime
+    capo: int
+    transpose_semitones: int
 
-class LoginSchema(Schema):
+
+class LoginIn(msgspec.Struct, forbid_unknown_fields=True):
     """Schema for login requests."""
-    email = fields.Email(required=True)
-    password = fields.Str(required=True)
+    email: Email
+    password: str
 
 
-class RegisterSchema(Schema):
+class RegisterIn(msgspec.Struct, forbid_unknown_fields=True):
     """Schema for registration requests."""
-    email = fields.Email(required=True, validate=validate.Length(max=255))
-    password = fields.Str(required=True, validate=validate.Length(min=8))
-
-    @validates('password')
-    def validate_password(self, value):
-        # Basic password validation
-        if len(value) < 8:
-            raise ValidationError('Password must be at least 8 characters long')
+    email: Email
+    password: Password
+
+    def __post_init__(self):
+        # Basic password validation (raised as msgspec.ValidationError)
+        value = self.password
         if not any(c.isdigit() for c in value):
-            raise ValidationError('Password must contain at least one digit')
+            raise ValueError('Password must contain at least one digit')
         if not any(c.isupper() for c in value):
-            raise ValidationError('Password must contain at least one uppercase letter')
+            raise ValueError('Password must contain at least one uppercase letter')
         if not any(c.islower() for c in value):
-            raise ValidationError('Password must contain at least one lowercase letter')
\ No newline at end of file
+            raise ValueError('Password must contain at least one lowercase letter')
+
+
+def dump(obj, schema):
+    """
+    Convert ORM object(s) into schema structs ready for encoding.
+
+    Args:
+        obj: ORM instance or list of instances
+        schema: Struct type, e.g. SongOut or list[SongOut]
+
+    Returns:
+        Struct instance(s)
+    """
+    return msgspec.convert(obj, type=schema, from_attributes=True)
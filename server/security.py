@@ -1,5 +1,7 @@
 """Security module for password hashing and JWT authentication."""
+import math
 import os
+import time
 from functools import wraps
 from datetime import timedelta
 from argon2 import PasswordHasher
@@ -8,20 +10,100 @@ from flask import current_app
 from flask_jwt_extended import (
     create_access_token,
     create_refresh_token,
-    get_jwt_identity,
-    jwt_required as jwt_required_orig,
-    verify_jwt_in_request
+    jwt_required as jwt_required_orig
 )
 
 
-# Initialize Argon2 password hasher with secure parameters
-ph = PasswordHasher(
-    time_cost=2,        # Number of iterations
-    memory_cost=65536,  # 64 MB
-    parallelism=1,      # Number of parallel threads
-    hash_len=32,        # Length of the hash in bytes
-    salt_len=16         # Length of the salt in bytes
-)
+# Environment settings, read once at import time (load_dotenv runs before this module is imported)
+AUTH_ENABLED = os.getenv('AUTH_ENABLED', 'false').lower() == 'true'
+PEPPER = os.getenv('PEPPER', 'default_pepper_change_in_production').encode()
+
+# Argon2 calibration settings. Memory candidates (KiB) start at the OWASP
+# minimum so a burst of concurrent logins doesn't allocate 64 MB each.
+ARGON2_TARGET_SECONDS = float(os.getenv('ARGON2_TARGET_MS', '150')) / 1000
+ARGON2_MEMORY_CANDIDATES = (19456, 32768, 47104, 65536)
+ARGON2_MIN_TIME_COST = 2
+ARGON2_MAX_TIME_COST = 10
+
+
+def _make_hasher(time_cost: int, memory_cost: int) -> PasswordHasher:
+    """Create an Argon2id password hasher with the given cost parameters."""
+    return PasswordHasher(
+        time_cost=time_cost,      # Number of iterations
+        memory_cost=memory_cost,  # Memory in KiB
+        parallelism=1,            # Number of parallel threads
+        hash_len=32,              # Length of the hash in bytes
+        salt_len=16               # Length of the salt in bytes
+    )
+
+
+def calibrate_hasher(target_seconds: float = ARGON2_TARGET_SECONDS) -> PasswordHasher:
+    """
+    Pick Argon2 parameters that take about target_seconds per hash on this machine.
+
+    Prefers the smallest memory cost and scales time_cost to reach the target
+    (Argon2 run time is linear in time_cost).
+
+    Args:
+        target_seconds: Desired wall time per hash
+
+    Returns:
+        Calibrated password hasher
+    """
+    for memory_cost in ARGON2_MEMORY_CANDIDATES:
+        start = time.perf_counter()
+        _make_hasher(ARGON2_MIN_TIME_COST, memory_cost).hash('calibration')
+        elapsed = time.perf_counter() - start
+
+        time_cost = max(ARGON2_MIN_TIME_COST, math.ceil(ARGON2_MIN_TIME_COST * target_seconds / elapsed))
+        if time_cost <= ARGON2_MAX_TIME_COST:
+            return _make_hasher(time_cost, memory_cost)
+
+    return _make_hasher(ARGON2_MAX_TIME_COST, ARGON2_MEMORY_CANDIDATES[-1])
+
+
+def _configure_hasher() -> PasswordHasher:
+    """
+    Use explicit ARGON2_TIME_COST/ARGON2_MEMORY_COST if set, else calibrate.
+
+    Under Gunicorn this runs once in the master (preload_app), so all
+    workers share the same parameters. The result is logged so it can be
+    pinned with the environment variables above.
+    """
+    time_cost = os.getenv('ARGON2_TIME_COST')
+    memory_cost = os.getenv('ARGON2_MEMORY_COST')
+    if time_cost and memory_cost:
+        hasher = _make_hasher(int(time_cost), int(memory_cost))
+        source = 'configured'
+    else:
+        hasher = calibrate_hasher()
+        source = 'calibrated'
+
+    print(f"Argon2 parameters ({source}): "
+          f"time_cost={hasher.time_cost}, memory_cost={hasher.memory_cost}")
+    return hasher
+
+
+def _run_blocking(fn, *args):
+    """
+    Run a CPU-bound call without stalling other requests.
+
+    Under Gunicorn's gevent workers a long C call blocks every greenlet in
+    the worker, so it is handed to gevent's native thread pool instead
+    (argon2-cffi releases the GIL while hashing). Otherwise it runs inline.
+    """
+    try:
+        from gevent import monkey, get_hub
+    except ImportError:
+        return fn(*args)
+
+    if not monkey.is_module_patched('threading'):
+        return fn(*args)
+    return get_hub().threadpool.apply(fn, args)
+
+
+# Initialize Argon2 password hasher, calibrated for this machine
+ph = _configure_hasher()
 
 
 def hash_password(password: str) -> str:
@@ -34,9 +116,8 @@ def hash_password(password: str) -> str:
     Returns:
         Hashed password string
     """
-    pepper = os.getenv('PEPPER', 'default_pepper_change_in_production')
-    peppered_password = password + pepper
-    return ph.hash(peppered_password)
+    peppered_password = password.encode() + PEPPER
+    return _run_blocking(ph.hash, peppered_password)
 
 
 def verify_password(password: str, password_hash: str) -> bool:
@@ -50,17 +131,28 @@ def verify_password(password: str, password_hash: str) -> bool:
     Returns:
         True if password matches, False otherwise
     """
-    try:
-        pepper = os.getenv('PEPPER', 'default_pepper_change_in_production')
-        peppered_password = password + pepper
-        ph.verify(password_hash, peppered_password)
+    peppered_password = password.encode() + PEPPER
+    if not _run_blocking(_verify, password_hash, peppered_password):
+        return False
 
-        # Check if rehashing is needed (parameters changed)
-        if ph.check_needs_rehash(password_hash):
-            # In production, you might want to rehash and update the database
-            pass
+    # Check if rehashing is needed (parameters changed)
+    if ph.check_needs_rehash(password_hash):
+        # In production, you might want to rehash and update the database
+        pass
 
-        return True
+    return True
+
+
+def _verify(password_hash: str, peppered_password: bytes) -> bool:
+    """
+    Check a peppered password against its hash, returning False on mismatch.
+
+    Runs in the gevent thread pool, so failures are returned rather than
+    raised: gevent's hub prints a traceback for every exception that
+    crosses the pool boundary, i.e. for every wrong-password login.
+    """
+    try:
+        return ph.verify(password_hash, peppered_password)
     except (VerifyMismatchError, VerificationError, InvalidHash):
         return False
 
@@ -93,30 +185,6 @@ def create_tokens(user_id: int) -> dict:
     }
 
 
-def optional_auth(f):
-    """
-    Decorator that makes JWT authentication optional.
-    If AUTH_ENABLED is false, proceeds without authentication.
-    If AUTH_ENABLED is true, requires valid JWT.
-    """
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        auth_enabled = os.getenv('AUTH_ENABLED', 'false').lower() == 'true'
-
-        if auth_enabled:
-            # Verify JWT if auth is enabled
-            verify_jwt_in_request(optional=True)
-            user_id = get_jwt_identity()
-        else:
-            # In demo mode, use a default user_id
-            user_id = None
-
-        # Pass user_id to the route handler
-        return f(user_id=user_id, *args, **kwargs)
-
-    return decorated_function
-
-
 def require_auth(f):
     """
     Decorator that requires JWT authentication.
@@ -124,9 +192,7 @@ def require_auth(f):
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        auth_enabled = os.getenv('AUTH_ENABLED', 'false').lower() == 'true'
-
-        if not auth_enabled:
+        if not AUTH_ENABLED:
             # In demo mode, use a default user_id
             return f(user_id=None, *args, **kwargs)
 
@@ -1,5 +1,6 @@
 """ChordPro format parsing and validation service."""
 import re
+from functools import lru_cache
 from typing import Dict, Optional, List, Tuple
 
 
@@ -11,8 +12,38 @@ class ChordProService:
     DIRECTIVE_REGEX = re.compile(r'\{([^:}]+)(?::([^}]*))?\}')
     CHORD_LINE_REGEX = re.compile(r'^(\s*\[[^\]]+\]\s*)+$')
 
+    # DIRECTIVE_REGEX confined to a single line, for scanning whole content at once
+    _LINE_DIRECTIVE_REGEX = re.compile(r'\{([^:}\n]+)(?::([^}\n]*))?\}')
+
+    # Block directives: directive name -> ('push' | 'pop', block)
+    _BLOCK_DISPATCH = {
+        **{name: ('push', 'chorus') for name in ('soc', 'start_of_chorus', 'chorus')},
+        **{name: ('pop', 'chorus') for name in ('eoc', 'end_of_chorus')},
+        **{name: ('push', 'verse') for name in ('sov', 'start_of_verse', 'verse')},
+        **{name: ('pop', 'verse') for name in ('eov', 'end_of_verse')},
+        **{name: ('push', 'bridge') for name in ('sob', 'start_of_bridge', 'bridge')},
+        **{name: ('pop', 'bridge') for name in ('eob', 'end_of_bridge')},
+        **{name: ('push', 'tab') for name in ('sot', 'start_of_tab', 'tab')},
+        **{name: ('pop', 'tab') for name in ('eot', 'end_of_tab')},
+    }
+
+    # Metadata directives: directive name -> metadata field
+    _METADATA_KEYS = {
+        'title': 'title', 't': 'title',
+        'artist': 'artist', 'a': 'artist',
+        'capo': 'capo',
+        'key': 'key',
+        'tempo': 'tempo',
+        'time': 'time',
+    }
+
+    # Largest content (in characters) whose prepare() result is cached. With
+    # 256 entries this bounds each worker's cache to 256 x (input + output)
+    # of at most 16K characters each; typical songs are 2-5K characters.
+    _PREPARE_CACHE_MAX_LENGTH = 16 * 1024
+
     # Supported ChordPro directives
-    SUPPORTED_DIRECTIVES = {
+    SUPPORTED_DIRECTIVES = frozenset({
         'title', 't',
         'subtitle', 'st',
         'artist', 'a',
@@ -22,7 +53,7 @@ class ChordProService:
         'time',
         'comment', 'c',
         'comment_italic', 'ci',
-        'comment_box', 'cb',
+        'comment_box', 'cb',  # 'cb' also abbreviates column_break
         'chorus', 'soc', 'start_of_chorus',
         'end_of_chorus', 'eoc',
         'verse', 'sov', 'start_of_verse',
@@ -36,10 +67,9 @@ class ChordProService:
         'no_grid', 'ng',
         'new_page', 'np',
         'new_physical_page', 'npp',
-        'column_break', 'cb',
-        'columns', 'col',
-        'column', 'col'
-    }
+        'column_break',
+        'columns', 'column', 'col',
+    })
 
     @classmethod
     def validate(cls, content: str) -> Tuple[bool, Optional[str]]:
@@ -55,44 +85,30 @@ class ChordProService:
         if not content or not content.strip():
             return False, "Content cannot be empty"
 
-        lines = content.split('\n')
+        # Check block directives with one scan over the whole content
+        # (skipped for plain lyrics and chords, which have no directives)
         open_blocks = []
-
-        for line_num, line in enumerate(lines, 1):
-            # Check for directives
-            directives = cls.DIRECTIVE_REGEX.findall(line)
-            for directive, _ in directives:
-                # Handle block directives
-                if directive in ['soc', 'start_of_chorus', 'chorus']:
-                    open_blocks.append('chorus')
-                elif directive in ['eoc', 'end_of_chorus']:
-                    if not open_blocks or open_blocks[-1] != 'chorus':
-                        return False, f"Line {line_num}: Unexpected end_of_chorus"
-                    open_blocks.pop()
-                elif directive in ['sov', 'start_of_verse', 'verse']:
-                    open_blocks.append('verse')
-                elif directive in ['eov', 'end_of_verse']:
-                    if not open_blocks or open_blocks[-1] != 'verse':
-                        return False, f"Line {line_num}: Unexpected end_of_verse"
-                    open_blocks.pop()
-                elif directive in ['sob', 'start_of_bridge', 'bridge']:
-                    open_blocks.append('bridge')
-                elif directive in ['eob', 'end_of_bridge']:
-                    if not open_blocks or open_blocks[-1] != 'bridge':
-                        return False, f"Line {line_num}: Unexpected end_of_bridge"
-                    open_blocks.pop()
-                elif directive in ['sot', 'start_of_tab', 'tab']:
-                    open_blocks.append('tab')
-                elif directive in ['eot', 'end_of_tab']:
-                    if not open_blocks or open_blocks[-1] != 'tab':
-                        return False, f"Line {line_num}: Unexpected end_of_tab"
-                    open_blocks.pop()
-
-            # Check for unmatched brackets in chords
-            chord_count_open = line.count('[')
-            chord_count_close = line.count(']')
-            if chord_count_open != chord_count_close:
-                return False, f"Line {line_num}: Unmatched brackets in chords"
+        error_line = None
+        error = None
+        if '{' in content:
+            for match in cls._LINE_DIRECTIVE_REGEX.finditer(content):
+                block = cls._track_block(match.group(1), open_blocks)
+                if block:
+                    error_line = content.count('\n', 0, match.start()) + 1
+                    error = f"Line {error_line}: Unexpected end_of_{block}"
+                    break
+
+        # Check for unmatched brackets in chords on the lines before that error.
+        # Balanced totals don't rule out a bad line, but no brackets at all does.
+        if '[' in content or ']' in content:
+            for line_num, line in enumerate(content.split('\n'), 1):
+                if line_num == error_line:
+                    break
+                if line.count('[') != line.count(']'):
+                    return False, f"Line {line_num}: Unmatched brackets in chords"
+
+        if error:
+            return False, error
 
         # Check for unclosed blocks
         if open_blocks:
@@ -121,7 +137,8 @@ class ChordProService:
             content = ""
 
         lines = content.split('\n')
-        metadata_lines = []
+        replacements = cls._metadata_directives(title, artist, capo, key)
+        result = []  # Metadata lines, then the content appended at the end
         content_lines = []
         metadata_found = {
             'title': False,
@@ -132,60 +149,174 @@ class ChordProService:
 
         # Parse existing content and separate metadata from content
         for line in lines:
-            directives = cls.DIRECTIVE_REGEX.findall(line)
             is_metadata = False
-
-            for directive, value in directives:
-                if directive in ['title', 't']:
-                    metadata_found['title'] = True
-                    if title:
-                        line = f"{{title:{title}}}"
-                    is_metadata = True
-                elif directive in ['artist', 'a']:
-                    metadata_found['artist'] = True
-                    if artist:
-                        line = f"{{artist:{artist}}}"
-                    is_metadata = True
-                elif directive == 'capo':
-                    metadata_found['capo'] = True
-                    if capo is not None:
-                        line = f"{{capo:{capo}}}"
-                    is_metadata = True
-                elif directive == 'key':
-                    metadata_found['key'] = True
-                    if key:
-                        line = f"{{key:{key}}}"
-                    is_metadata = True
+            if '{' in line:
+                line, is_metadata = cls._rewrite_metadata(
+                    line, cls.DIRECTIVE_REGEX.findall(line), replacements, metadata_found
+                )
 
             if is_metadata:
-                metadata_lines.append(line)
+                result.append(line)
             else:
                 content_lines.append(line)
 
         # Add missing metadata at the beginning
-        new_metadata = []
-        if title and not metadata_found['title']:
-            new_metadata.append(f"{{title:{title}}}")
-        if artist and not metadata_found['artist']:
-            new_metadata.append(f"{{artist:{artist}}}")
-        if capo is not None and not metadata_found['capo']:
-            new_metadata.append(f"{{capo:{capo}}}")
-        if key and not metadata_found['key']:
-            new_metadata.append(f"{{key:{key}}}")
-
-        # Combine all parts
-        result = []
-        if new_metadata:
-            result.extend(new_metadata)
-        if metadata_lines:
-            result.extend(metadata_lines)
+        result[:0] = cls._missing_metadata(replacements, metadata_found)
+
         # Add empty line between metadata and content if both exist and content has text
-        if result and content_lines and len(content_lines) > 0 and any(line.strip() for line in content_lines):
+        if result and any(line.strip() for line in content_lines):
             result.append('')
         result.extend(content_lines)
 
         return '\n'.join(result)
 
+    @classmethod
+    def prepare(cls, content: str, title: Optional[str] = None,
+                artist: Optional[str] = None, capo: Optional[int] = None,
+                key: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Clean, validate and inject metadata into ChordPro content in one walk.
+
+        Produces the same content as clean_content(), validate() and
+        inject_metadata() chained, without splitting and rescanning the
+        content for each step. Unclosed blocks are tolerated.
+
+        Results for song-sized content are cached: the editor autosaves the
+        same content over and over, and the output depends only on the arguments.
+
+        Args:
+            content: Raw ChordPro content
+            title: Song title
+            artist: Song artist/author
+            capo: Capo position
+            key: Song key
+
+        Returns:
+            Tuple of (prepared_content, error_message); content is None on error
+        """
+        if len(content) > cls._PREPARE_CACHE_MAX_LENGTH:
+            return cls._prepare(content, title, artist, capo, key)
+        return cls._prepare_cached(content, title, artist, capo, key)
+
+    @classmethod
+    @lru_cache(maxsize=256, typed=True)
+    def _prepare_cached(cls, content: str, title: Optional[str], artist: Optional[str],
+                        capo: Optional[int], key: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+        """Cached prepare() for content up to _PREPARE_CACHE_MAX_LENGTH characters."""
+        return cls._prepare(content, title, artist, capo, key)
+
+    @classmethod
+    def _prepare(cls, content: str, title: Optional[str], artist: Optional[str],
+                 capo: Optional[int], key: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+        """Uncached implementation of prepare()."""
+        open_blocks = []
+        replacements = cls._metadata_directives(title, artist, capo, key)
+        metadata_found = {
+            'title': False,
+            'artist': False,
+            'capo': False,
+            'key': False
+        }
+        result = []  # Metadata lines, then the content appended at the end
+        content_lines = []
+        has_text = False
+
+        for line_num, line in enumerate(cls._clean_lines(content), 1):
+            directives = cls.DIRECTIVE_REGEX.findall(line) if '{' in line else None
+            if directives:
+                for directive, _ in directives:
+                    block = cls._track_block(directive, open_blocks)
+                    if block:
+                        return None, f"Line {line_num}: Unexpected end_of_{block}"
+
+            if line.count('[') != line.count(']'):
+                return None, f"Line {line_num}: Unmatched brackets in chords"
+
+            is_metadata = False
+            if directives:
+                line, is_metadata = cls._rewrite_metadata(
+                    line, directives, replacements, metadata_found
+                )
+
+            if is_metadata:
+                result.append(line)
+            else:
+                content_lines.append(line)
+                has_text = has_text or bool(line)
+
+        if not result and not has_text:
+            return None, "Content cannot be empty"
+
+        result[:0] = cls._missing_metadata(replacements, metadata_found)
+        if result and has_text:
+            result.append('')
+        result.extend(content_lines)
+
+        return '\n'.join(result), None
+
+    @classmethod
+    def _track_block(cls, directive: str, open_blocks: List[str]) -> Optional[str]:
+        """
+        Push or pop a block directive on the open_blocks stack.
+
+        Returns:
+            Name of the block if the directive ends a block that isn't open, or None
+        """
+        op = cls._BLOCK_DISPATCH.get(directive)
+        if op is None:
+            return None
+
+        action, block = op
+        if action == 'push':
+            open_blocks.append(block)
+        elif open_blocks and open_blocks[-1] == block:
+            open_blocks.pop()
+        else:
+            return block
+        return None
+
+    @staticmethod
+    def _metadata_directives(title: Optional[str], artist: Optional[str],
+                             capo: Optional[int], key: Optional[str]) -> Dict[str, Optional[str]]:
+        """Build the directive line for each metadata value that was given."""
+        return {
+            'title': f"{{title:{title}}}" if title else None,
+            'artist': f"{{artist:{artist}}}" if artist else None,
+            'capo': f"{{capo:{capo}}}" if capo is not None else None,
+            'key': f"{{key:{key}}}" if key else None,
+        }
+
+    @classmethod
+    def _rewrite_metadata(cls, line: str, directives: List[Tuple[str, str]],
+                          replacements: Dict[str, Optional[str]],
+                          metadata_found: Dict[str, bool]) -> Tuple[str, bool]:
+        """
+        Replace the metadata directives of one line with the given values.
+
+        Returns:
+            Tuple of (line, is_metadata)
+        """
+        is_metadata = False
+
+        for directive, _ in directives:
+            field = cls._METADATA_KEYS.get(directive)
+            if field in metadata_found:
+                metadata_found[field] = True
+                if replacements[field]:
+                    line = replacements[field]
+                is_metadata = True
+
+        return line, is_metadata
+
+    @staticmethod
+    def _missing_metadata(replacements: Dict[str, Optional[str]],
+                          metadata_found: Dict[str, bool]) -> List[str]:
+        """Build the directives for metadata values not present in the content."""
+        return [
+            directive for field, directive in replacements.items()
+            if directive and not metadata_found[field]
+        ]
+
     @classmethod
     def extract_metadata(cls, content: str) -> Dict[str, Optional[str]]:
         """
@@ -208,21 +339,14 @@ class ChordProService:
 
         directives = cls.DIRECTIVE_REGEX.findall(content)
         for directive, value in directives:
-            if directive in ['title', 't']:
-                metadata['title'] = value or ''
-            elif directive in ['artist', 'a']:
-                metadata['artist'] = value or ''
-            elif directive == 'capo':
+            field = cls._METADATA_KEYS.get(directive)
+            if field == 'capo':
                 try:
                     metadata['capo'] = int(value) if value else 0
                 except ValueError:
                     metadata['capo'] = 0
-            elif directive == 'key':
-                metadata['key'] = value or ''
-            elif directive == 'tempo':
-                metadata['tempo'] = value or ''
-            elif directive == 'time':
-                metadata['time'] = value or ''
+            elif field:
+                metadata[field] = value or ''
 
         return metadata
 
@@ -239,36 +363,43 @@ class ChordProService:
         """
         segments = []
         last_end = 0
-
-        # Find all chords in the line
-        for match in cls.CHORD_REGEX.finditer(line):
-            start, end = match.span()
+        search_from = 0
+
+        # Find all chords in the line: '[' followed by at least one
+        # character up to the next ']' (same matches as CHORD_REGEX)
+        while True:
+            start = line.find('[', search_from)
+            if start < 0:
+                break
+            end = line.find(']', start + 1)
+            if end < 0:
+                break
+            if end == start + 1:
+                # "[]" is not a chord, keep looking after the '['
+                search_from = start + 1
+                continue
 
             # Add text before the chord (if any)
             if start > last_end:
-                text = line[last_end:start]
-                if text:
-                    segments.append({
-                        'type': 'text',
-                        'content': text
-                    })
+                segments.append({
+                    'type': 'text',
+                    'content': line[last_end:start]
+                })
 
             # Add the chord
             segments.append({
                 'type': 'chord',
-                'content': match.group(1)
+                'content': line[start + 1:end]
             })
 
-            last_end = end
+            last_end = search_from = end + 1
 
         # Add remaining text after the last chord
         if last_end < len(line):
-            text = line[last_end:]
-            if text:
-                segments.append({
-                    'type': 'text',
-                    'content': text
-                })
+            segments.append({
+                'type': 'text',
+                'content': line[last_end:]
+            })
 
         return segments
 
@@ -283,26 +414,31 @@ class ChordProService:
         Returns:
             Cleaned and normalized content
         """
-        # Remove carriage returns
-        content = content.replace('\r\n', '\n').replace('\r', '\n')
+        return '\n'.join(cls._clean_lines(content))
 
-        # Remove trailing whitespace from each line
-        lines = [line.rstrip() for line in content.split('\n')]
+    @staticmethod
+    def _clean_lines(content: str) -> List[str]:
+        """
+        Split content into cleaned lines.
 
-        # Remove excessive empty lines (max 2 consecutive)
+        Normalizes line endings, strips trailing whitespace, allows at most
+        2 consecutive empty lines and drops trailing empty lines.
+        """
         cleaned_lines = []
         empty_count = 0
-        for line in lines:
-            if not line:
-                empty_count += 1
-                if empty_count <= 2:
-                    cleaned_lines.append(line)
-            else:
+        # splitlines() handles \r\n, \r and \n (and Unicode line breaks) in one pass
+        for line in content.splitlines():
+            line = line.rstrip()
+            if line:
                 empty_count = 0
-                cleaned_lines.append(line)
+            else:
+                empty_count += 1
+                if empty_count > 2:
+                    continue
+            cleaned_lines.append(line)
 
         # Remove trailing empty lines
         while cleaned_lines and not cleaned_lines[-1]:
             cleaned_lines.pop()
 
-        return '\n'.join(cleaned_lines)
\ No newline at end of file
+        return cleaned_lines
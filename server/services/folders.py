@@ -1,7 +1,7 @@
 """Service for folder operations."""
 from typing import Optional, List, Dict
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.orm import Session, raiseload, selectinload
+from sqlalchemy import func, select
 from models import Folder, Song
 from db import db
 
@@ -27,18 +27,19 @@ class FoldersService:
         return folder
 
     @staticmethod
-    def get_folder(folder_id: int, user_id: Optional[int] = None) -> Optional[Folder]:
+    def get_folder(folder_id: int, user_id: Optional[int] = None, options=()) -> Optional[Folder]:
         """
         Get a folder by ID.
 
         Args:
             folder_id: Folder ID
             user_id: Optional user ID for filtering
+            options: Optional loader options (e.g. selectinload) for the query
 
         Returns:
             Folder object or None
         """
-        query = db.session.query(Folder).filter(Folder.id == folder_id)
+        query = db.session.query(Folder).options(*options).filter(Folder.id == folder_id)
 
         if user_id is not None:
             query = query.filter(Folder.user_id == user_id)
@@ -77,9 +78,13 @@ class FoldersService:
         Returns:
             List of folder dictionaries with song counts
         """
+        # Select plain columns - no Folder objects are built or tracked
         query = db.session.query(
-            Folder,
-            func.count(Song.id).label('songs_count')
+            Folder.id,
+            Folder.user_id,
+            Folder.name,
+            Folder.created_at,
+            func.count(Song.id)
         ).outerjoin(Song, Folder.id == Song.folder_id)
 
         if user_id is not None:
@@ -89,17 +94,43 @@ class FoldersService:
 
         query = query.group_by(Folder.id).order_by(Folder.created_at.desc())
 
-        results = []
-        for folder, count in query.all():
-            folder_dict = {
-                'id': folder.id,
-                'name': folder.name,
-                'created_at': folder.created_at,
+        return [
+            {
+                'id': folder_id,
+                'user_id': folder_user_id,
+                'name': name,
+                'created_at': created_at,
                 'songs_count': count
             }
-            results.append(folder_dict)
+            for folder_id, folder_user_id, name, created_at, count in query.all()
+        ]
 
-        return results
+    @staticmethod
+    def get_folders_version(user_id: Optional[int] = None) -> tuple:
+        """
+        Get a cheap fingerprint of the folder listing for ETag validation.
+
+        Changes whenever a folder or song is added, removed, renamed or edited.
+
+        Args:
+            user_id: Optional user ID for filtering
+
+        Returns:
+            Tuple of (folder count, latest folder update, song count, latest song update)
+        """
+        if user_id is not None:
+            folder_filter = Folder.user_id == user_id
+            song_filter = Song.user_id == user_id
+        else:
+            folder_filter = Folder.user_id.is_(None)
+            song_filter = Song.user_id.is_(None)
+
+        return tuple(db.session.execute(select(
+            select(func.count(Folder.id)).where(folder_filter).scalar_subquery(),
+            select(func.max(Folder.updated_at)).where(folder_filter).scalar_subquery(),
+            select(func.count(Song.id)).where(song_filter).scalar_subquery(),
+            select(func.max(Song.updated_at)).where(song_filter).scalar_subquery()
+        )).one())
 
     @staticmethod
     def update_folder(folder_id: int, name: str, user_id: Optional[int] = None) -> Optional[Folder]:
@@ -134,7 +165,12 @@ class FoldersService:
         Returns:
             True if deleted, False otherwise
         """
-        folder = FoldersService.get_folder(folder_id, user_id)
+        # Load songs and their versions up front so the cascade doesn't
+        # lazy load the versions of each song one query at a time
+        folder = FoldersService.get_folder(
+            folder_id, user_id,
+            options=(selectinload(Folder.songs).selectinload(Song.versions),)
+        )
 
         if folder:
             # Songs will be deleted automatically due to cascade
@@ -156,9 +192,28 @@ class FoldersService:
         Returns:
             List of song objects
         """
-        query = db.session.query(Song).filter(Song.folder_id == folder_id)
+        query = db.session.query(Song).options(raiseload('*')).filter(Song.folder_id == folder_id)
 
         if user_id is not None:
             query = query.filter(Song.user_id == user_id)
 
-        return query.order_by(Song.updated_at.desc()).all()
\ No newline at end of file
+        return query.order_by(Song.updated_at.desc()).all()
+
+    @staticmethod
+    def get_folder_songs_version(folder_id: int, user_id: Optional[int] = None) -> tuple:
+        """
+        Get a cheap fingerprint of a folder's song listing for ETag validation.
+
+        Args:
+            folder_id: Folder ID
+            user_id: Optional user ID for filtering
+
+        Returns:
+            Tuple of (song count, latest song update)
+        """
+        query = select(func.count(Song.id), func.max(Song.updated_at)).where(Song.folder_id == folder_id)
+
+        if user_id is not None:
+            query = query.where(Song.user_id == user_id)
+
+        return tuple(db.session.execute(query).one())
\ No newline at end of file
@@ -1,11 +1,15 @@
 """Service for song operations."""
 from typing import Optional, List, Dict
-from datetime import datetime
-from sqlalchemy import or_, and_
-from models import Song, SongVersion, Folder
+from flask import current_app
+from sqlalchemy import or_, and_, column, insert, select, table
+from sqlalchemy.orm import raiseload, selectinload
+from models import Song, SongVersion, Folder, utcnow
 from services.chordpro import ChordProService
 from db import db
 
+# Full-text search index over songs (created by db.init_search_index)
+songs_fts = table('songs_fts', column('rowid'), column('songs_fts'))
+
 
 class SongsService:
     """Service class for song-related operations."""
@@ -35,28 +39,16 @@ class SongsService:
         Returns:
             Created song object
         """
-        # Clean content first
-        content_chordpro = ChordProService.clean_content(content_chordpro)
-
-        # Validate ChordPro content (but be lenient)
-        is_valid, error = ChordProService.validate(content_chordpro)
-        if not is_valid and error and 'Unclosed block' not in str(error):
-            # Only fail on critical errors, not formatting issues
+        # Clean, validate (leniently) and inject metadata
+        content_chordpro, error = ChordProService.prepare(
+            content_chordpro,
+            title=title,
+            artist=author if author else None,
+            capo=capo if capo else 0
+        )
+        if error:
             raise ValueError(f"Invalid ChordPro content: {error}")
 
-        # Inject metadata
-        try:
-            content_chordpro = ChordProService.inject_metadata(
-                content_chordpro,
-                title=title,
-                artist=author if author else None,
-                capo=capo if capo else 0
-            )
-        except Exception as e:
-            # If metadata injection fails, use original content
-            print(f"Warning: Failed to inject metadata: {e}")
-            pass
-
         # Create song
         song = Song(
             title=title,
@@ -68,33 +60,71 @@ class SongsService:
             user_id=user_id
         )
         db.session.add(song)
-        db.session.commit()
+        # Flush to get song.id; song and initial version commit together
+        db.session.flush()
 
         # Create initial version
-        version = SongVersion(
-            song_id=song.id,
-            content_chordpro=content_chordpro,
-            capo=capo,
-            transpose_semitones=transpose_semitones
-        )
-        db.session.add(version)
+        SongsService._save_version(song.id, content_chordpro, capo, transpose_semitones)
         db.session.commit()
 
         return song
 
     @staticmethod
-    def get_song(song_id: int, user_id: Optional[int] = None) -> Optional[Song]:
+    def _save_version(song_id: int, content_chordpro: str, capo: int, transpose_semitones: int) -> None:
+        """
+        Record a version history entry.
+
+        Uses a single Core INSERT instead of the ORM unit of work - versions
+        are write-only here, so there is no object state worth tracking.
+
+        Args:
+            song_id: Song ID
+            content_chordpro: ChordPro content to save
+            capo: Capo position
+            transpose_semitones: Transposition in semitones
+        """
+        db.session.execute(insert(SongVersion), [{
+            'song_id': song_id,
+            'content_chordpro': content_chordpro,
+            'capo': capo,
+            'transpose_semitones': transpose_semitones
+        }])
+
+    @staticmethod
+    def _has_metadata(content_chordpro: str, title: str, artist: Optional[str], capo: int) -> bool:
+        """
+        Check whether content's directives already hold the given metadata.
+
+        Args:
+            content_chordpro: ChordPro content
+            title: Expected title
+            artist: Expected artist (None or empty means any)
+            capo: Expected capo position
+
+        Returns:
+            True if injecting this metadata would not change any directive value
+        """
+        metadata = ChordProService.extract_metadata(content_chordpro)
+        return (
+            metadata['title'] == title
+            and (not artist or metadata['artist'] == artist)
+            and metadata['capo'] == capo
+        )
+
+    @staticmethod
+    def get_song(song_id: int, user_id: Optional[int] = None, options=()) -> Optional[Song]:
         """
         Get a song by ID.
 
         Args:
             song_id: Song ID
             user_id: Optional user ID for filtering
+            options: Optional loader options (e.g. selectinload) for the query
 
         Returns:
             Song object or None
         """
-        query = db.session.query(Song).filter(Song.id == song_id)
+        query = db.session.query(Song).options(*options).filter(Song.id == song_id)
 
         if user_id is not None:
             query = query.filter(Song.user_id == user_id)
@@ -112,7 +142,7 @@ class SongsService:
         Returns:
             List of song objects
         """
-        query = db.session.query(Song)
+        query = db.session.query(Song).options(raiseload('*'))
 
         if user_id is not None:
             query = query.filter(Song.user_id == user_id)
@@ -156,39 +186,33 @@ class SongsService:
 
         # Save current version before updating
         if content_chordpro and content_chordpro != song.content_chordpro:
-            version = SongVersion(
-                song_id=song.id,
-                content_chordpro=song.content_chordpro,
-                capo=song.capo,
-                transpose_semitones=song.transpose_semitones
-            )
-            db.session.add(version)
-
-        # Validate new content if provided (be lenient)
-        if content_chordpro:
-            content_chordpro = ChordProService.clean_content(content_chordpro)
+            SongsService._save_version(song.id, song.content_chordpro, song.capo, song.transpose_semitones)
 
-            is_valid, error = ChordProService.validate(content_chordpro)
-            if not is_valid and error and 'Unclosed block' not in str(error):
-                # Only fail on critical errors
-                raise ValueError(f"Invalid ChordPro content: {error}")
+        # Clean, validate (leniently) and inject updated metadata
+        if content_chordpro is not None:
+            metadata = (
+                title or song.title,
+                author if author is not None else song.author,
+                capo if capo is not None else song.capo
+            )
+            # An autosave resending the stored content needs no second pass,
+            # but only if its directives already hold the wanted metadata
+            # (metadata-only updates and restored versions can leave them stale)
+            if (content_chordpro != song.content_chordpro
+                    or not SongsService._has_metadata(content_chordpro, *metadata)):
+                content_chordpro, error = ChordProService.prepare(
+                    content_chordpro,
+                    title=metadata[0],
+                    artist=metadata[1],
+                    capo=metadata[2]
+                )
+                if error:
+                    raise ValueError(f"Invalid ChordPro content: {error}")
 
         # Update fields
         if title is not None:
             song.title = title
         if content_chordpro is not None:
-            # Inject updated metadata
-            try:
-                content_chordpro = ChordProService.inject_metadata(
-                    content_chordpro,
-                    title=title or song.title,
-                    artist=author if author is not None else song.author,
-                    capo=capo if capo is not None else song.capo
-                )
-            except Exception as e:
-                # If metadata injection fails, use original content
-                print(f"Warning: Failed to inject metadata: {e}")
-                pass
             song.content_chordpro = content_chordpro
         if folder_id is not None:
             song.folder_id = folder_id
@@ -199,7 +223,7 @@ class SongsService:
         if transpose_semitones is not None:
             song.transpose_semitones = transpose_semitones
 
-        song.updated_at = datetime.utcnow()
+        song.updated_at = utcnow()
         db.session.commit()
 
         return song
@@ -216,7 +240,7 @@ class SongsService:
         Returns:
             True if deleted, False otherwise
         """
-        song = SongsService.get_song(song_id, user_id)
+        song = SongsService.get_song(song_id, user_id, options=(selectinload(Song.versions),))
 
         if song:
             # Versions will be deleted automatically due to cascade
@@ -241,15 +265,23 @@ class SongsService:
         Returns:
             List of matching song objects
         """
-        search_pattern = f"%{query}%"
-
-        db_query = db.session.query(Song).filter(
-            or_(
-                Song.title.ilike(search_pattern),
-                Song.author.ilike(search_pattern),
-                Song.content_chordpro.ilike(search_pattern)
+        db_query = db.session.query(Song).options(raiseload('*'))
+
+        # The trigram index can only match queries of 3+ characters
+        if current_app.config.get('SEARCH_INDEX_ENABLED') and len(query) >= 3:
+            # Quote as an FTS5 phrase so user input is never parsed as query syntax
+            phrase = '"' + query.replace('"', '""') + '"'
+            matches = select(songs_fts.c.rowid).where(songs_fts.c.songs_fts.op('MATCH')(phrase))
+            db_query = db_query.filter(Song.id.in_(matches))
+        else:
+            search_pattern = f"%{query}%"
+            db_query = db_query.filter(
+                or_(
+                    Song.title.ilike(search_pattern),
+                    Song.author.ilike(search_pattern),
+                    Song.content_chordpro.ilike(search_pattern)
+                )
             )
-        )
 
         if user_id is not None:
             db_query = db_query.filter(Song.user_id == user_id)
@@ -306,19 +338,13 @@ class SongsService:
             return None
 
         # Save current state as a version before restoring
-        current_version = SongVersion(
-            song_id=song.id,
-            content_chordpro=song.content_chordpro,
-            capo=song.capo,
-            transpose_semitones=song.transpose_semitones
-        )
-        db.session.add(current_version)
+        SongsService._save_version(song.id, song.content_chordpro, song.capo, song.transpose_semitones)
 
         # Restore from version
         song.content_chordpro = version.content_chordpro
         song.capo = version.capo
         song.transpose_semitones = version.transpose_semitones
-        song.updated_at = datetime.utcnow()
+        song.updated_at = utcnow()
 
         db.session.commit()
 
@@ -0,0 +1,12 @@
+"""WSGI entry point for running the app under Gunicorn."""
+import os
+
+# Monkey-patch the standard library before anything else is imported so
+# that sockets and DB drivers yield to other greenlets while waiting on I/O
+if os.getenv('GUNICORN_WORKER_CLASS', 'gevent') == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+from app import app  # noqa: E402
+
+__all__ = ['app']
@@ -3,11 +3,11 @@
 import sys
 sys.path.append('server')
 
-from schemas import SongSchema
-import json
+from schemas import SongIn
+import msgspec
 
 # Test the schema
-schema = SongSchema()
+decoder = msgspec.json.Decoder(SongIn)
 test_data = {
     "title": "Test Song",
     "content_chordpro": "Test content",
@@ -16,7 +16,7 @@ test_data = {
 }
 
 try:
-    result = schema.load(test_data)
+    result = decoder.decode(msgspec.json.encode(test_data))
     print("✅ Schema validation successful!")
     print("Result:", result)
 except Exception as e: